@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+PhantomFrame ML Service Tasks
+ARQ task definitions for background video watermark processing
+"""
+
+import os
+import logging
+from datetime import datetime
+
+import orjson
+
+from arq.connections import RedisSettings
+
+from app import processor, WatermarkRequest, DetectionRequest
+
+logger = logging.getLogger(__name__)
+
+
+def _drop_page_cache(path: str) -> None:
+    """Evict a processed upload from the page cache before deletion"""
+    if hasattr(os, 'posix_fadvise') and os.path.exists(path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def _cleanup_upload(file_path: str) -> None:
+    """Remove an upload after the job status is recorded.
+
+    Runs outside the status-updating try block so a cleanup problem can
+    never overwrite a completed job with a failure.
+    """
+    if not os.path.exists(file_path):
+        return
+    try:
+        _drop_page_cache(file_path)
+        os.remove(file_path)
+    except OSError as e:
+        logger.warning(f"Could not remove upload {file_path}: {e}")
+
+
+async def _update_job(r, job_id: str, **fields):
+    """Write only the changed job fields with one pipelined HSET + EXPIRE"""
+    fields["updated_at"] = datetime.utcnow().isoformat()
+    pipe = r.pipeline()
+    pipe.hset(f"job:{job_id}", mapping=fields)
+    pipe.expire(f"job:{job_id}", 3600)
+    await pipe.execute()
+
+
+async def process_watermark_embedding(ctx, job_id: str, file_path: str, config: dict):
+    """Process watermark embedding in an ARQ worker"""
+    r = ctx['redis']
+    known = await r.exists(f"job:{job_id}")
+
+    try:
+        # Update progress
+        if known:
+            await _update_job(r, job_id, progress=50.0)
+
+        # Process watermark
+        result = await processor.embed_watermark(file_path, WatermarkRequest(**config))
+
+        # Update job with results
+        if known:
+            await _update_job(r, job_id, status="completed", progress=100.0,
+                              result=orjson.dumps(result).decode())
+
+    except Exception as e:
+        logger.error(f"Watermark embedding failed for job {job_id}: {e}")
+
+        # Update job with error
+        if known:
+            await _update_job(r, job_id, status="failed", error=str(e))
+
+    finally:
+        _cleanup_upload(file_path)
+
+
+async def process_watermark_detection(ctx, job_id: str, file_path: str, config: dict,
+                                      file_hash: str = None, cfg_key: str = None):
+    """Process watermark detection in an ARQ worker"""
+    r = ctx['redis']
+    known = await r.exists(f"job:{job_id}")
+
+    try:
+        # Update progress
+        if known:
+            await _update_job(r, job_id, progress=50.0)
+
+        # Process detection
+        result = await processor.extract_watermark(file_path, DetectionRequest(**config))
+
+        # Populate the content-addressed detection cache (24h TTL)
+        if file_hash:
+            await r.setex(f"detect:{file_hash}:{cfg_key}", 86400, orjson.dumps(result))
+
+        # Update job with results
+        if known:
+            await _update_job(r, job_id, status="completed", progress=100.0,
+                              result=orjson.dumps(result).decode())
+
+    except Exception as e:
+        logger.error(f"Watermark detection failed for job {job_id}: {e}")
+
+        # Update job with error
+        if known:
+            await _update_job(r, job_id, status="failed", error=str(e))
+
+    finally:
+        _cleanup_upload(file_path)
+
+
+class WorkerSettings:
+    """ARQ worker configuration (run with: arq tasks.WorkerSettings)"""
+    functions = [process_watermark_embedding, process_watermark_detection]
+    redis_settings = RedisSettings(
+        host=os.getenv('REDIS_HOST', 'redis'),
+        port=int(os.getenv('REDIS_PORT', '6379'))
+    )
+    max_jobs = int(os.getenv('ARQ_MAX_JOBS', '4'))
+    job_timeout = 1800
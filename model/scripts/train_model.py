@@ -10,9 +10,13 @@ import argparse
 import json
 import logging
 from pathlib import Path
+import concurrent.futures
 import numpy as np
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use('Agg')  # headless rendering; safe off the main thread
+from matplotlib.figure import Figure
 import seaborn as sns
+from sklearn.metrics import confusion_matrix, classification_report
 
 # Add the src directory to the path
 sys.path.append(str(Path(__file__).parent.parent / 'src'))
@@ -83,7 +87,8 @@ def setup_directories(config: dict) -> None:
 
 def plot_training_history(history, output_dir: str) -> None:
     """Plot training history metrics."""
-    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+    fig = Figure(figsize=(15, 10))
+    axes = fig.subplots(2, 2)
     fig.suptitle('Training History', fontsize=16)
     
     # Accuracy
@@ -122,32 +127,26 @@ def plot_training_history(history, output_dir: str) -> None:
     axes[1, 1].legend()
     axes[1, 1].grid(True)
     
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, 'training_history.png'), dpi=300, bbox_inches='tight')
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_dir, 'training_history.png'), dpi=300, bbox_inches='tight')
     
     logger.info(f"Training history plots saved to {output_dir}")
 
-def plot_confusion_matrix(y_true: np.ndarray, y_pred: np.ndarray, output_dir: str) -> None:
-    """Plot confusion matrix."""
-    from sklearn.metrics import confusion_matrix, classification_report
-    
-    # Convert probabilities to class predictions
-    y_pred_classes = np.argmax(y_pred, axis=1)
-    
+def plot_confusion_matrix(y_true: np.ndarray, y_pred_classes: np.ndarray, output_dir: str) -> None:
+    """Plot confusion matrix from precomputed class predictions."""
     # Calculate confusion matrix
     cm = confusion_matrix(y_true, y_pred_classes)
     
     # Plot confusion matrix
-    plt.figure(figsize=(8, 6))
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
     sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
                 xticklabels=['No Watermark', 'Watermark'],
-                yticklabels=['No Watermark', 'Watermark'])
-    plt.title('Confusion Matrix')
-    plt.xlabel('Predicted')
-    plt.ylabel('Actual')
-    plt.savefig(os.path.join(output_dir, 'confusion_matrix.png'), dpi=300, bbox_inches='tight')
-    plt.close()
+                yticklabels=['No Watermark', 'Watermark'], ax=ax)
+    ax.set_title('Confusion Matrix')
+    ax.set_xlabel('Predicted')
+    ax.set_ylabel('Actual')
+    fig.savefig(os.path.join(output_dir, 'confusion_matrix.png'), dpi=300, bbox_inches='tight')
     
     # Print classification report
     report = classification_report(y_true, y_pred_classes, 
@@ -207,11 +206,13 @@ def main():
         logger.info("Initializing data generator...")
         data_generator = WatermarkDataGenerator(config['data'])
         
-        # Generate or load training data
-        data_path = os.path.join(config['output']['data_dir'], 'training_data')
-        if os.path.exists(data_path + '_X.npy'):
+        # Generate or load training data (probe the cache once, then memory-map it)
+        cached = os.path.exists(
+            os.path.join(config['output']['data_dir'], 'training_data_X.npy')
+        )
+        if cached:
             logger.info("Loading existing training data...")
-            X, y = data_generator.load_data(config['output']['data_dir'], 'training_data')
+            X, y = data_generator.load_data(config['output']['data_dir'], 'training_data', mmap=True)
         else:
             logger.info("Generating synthetic training data...")
             X, y = data_generator.generate_synthetic_data(config['training']['num_samples'])
@@ -247,8 +248,9 @@ def main():
         logger.info("Evaluating model on test set...")
         test_metrics = model.evaluate(test_data[0], test_data[1])
         
-        # Make predictions on test set
+        # Make predictions on test set (once; reused for the confusion matrix)
         test_predictions = model.predict(test_data[0])
+        test_pred_classes = np.argmax(test_predictions, axis=1)
         
         # Save model
         model_path = os.path.join(config['output']['model_dir'], 'watermark_detection_model.h5')
@@ -258,10 +260,21 @@ def main():
         tfjs_path = os.path.join(config['output']['model_dir'], 'tensorflowjs')
         model.export_for_tensorflowjs(tfjs_path)
         
-        # Create plots
+        # Export INT8-quantized TensorFlow Lite model
+        tflite_path = os.path.join(config['output']['model_dir'], 'watermark_detection_model_int8.tflite')
+        model.export_for_tflite(tflite_path, representative_data=train_data[0][:100])
+        
+        # Create plots (independent Agg figures render in parallel)
         logger.info("Creating training plots...")
-        plot_training_history(history, config['output']['plots_dir'])
-        plot_confusion_matrix(test_data[1], test_predictions, config['output']['plots_dir'])
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            plots = [
+                pool.submit(plot_training_history, history,
+                            config['output']['plots_dir']),
+                pool.submit(plot_confusion_matrix, test_data[1], test_pred_classes,
+                            config['output']['plots_dir'])
+            ]
+            for plot in plots:
+                plot.result()
         
         # Save training results
         results = {
@@ -282,6 +295,7 @@ def main():
         logger.info(f"Final test loss: {test_metrics['loss']:.4f}")
         logger.info(f"Model saved to: {model_path}")
         logger.info(f"TensorFlow.js model saved to: {tfjs_path}")
+        logger.info(f"INT8 TFLite model saved to: {tflite_path}")
         logger.info(f"Results saved to: {results_path}")
         
     except Exception as e:
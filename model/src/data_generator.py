@@ -7,15 +7,43 @@ Generates training data for the watermark detection model.
 import os
 import cv2
 import numpy as np
-import random
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, List, Generator, Optional, Dict, Any
 import logging
 from pathlib import Path
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _apply_wm_batch_numba(X, block_size, qp_lo, qp_hi, seed):  # pragma: no cover
+        """Apply per-block QP-delta watermarks to a batch, one thread per frame."""
+        n, h, w, c = X.shape
+        for s in prange(n):
+            np.random.seed(seed + s)
+            for i in range(0, h - block_size + 1, block_size):
+                for j in range(0, w - block_size + 1, block_size):
+                    if np.random.random() < 0.3:
+                        qp_delta = qp_lo + (qp_hi - qp_lo) * np.random.random()
+                        change = qp_delta * 0.05
+                        for bi in range(i, i + block_size):
+                            for bj in range(j, j + block_size):
+                                for ch in range(c):
+                                    v = X[s, bi, bj, ch] + change
+                                    if v < 0.0:
+                                        v = 0.0
+                                    elif v > 1.0:
+                                        v = 1.0
+                                    X[s, bi, bj, ch] = v
+
 class WatermarkDataGenerator:
     """
     Generates training data for watermark detection.
@@ -33,6 +61,16 @@ class WatermarkDataGenerator:
         """
         self.config = config
         self.frame_size = config.get('frame_size', (64, 64))
+        
+        # Single PCG64 generator for all randomness (seedable via config)
+        self.rng = np.random.default_rng(config.get('seed'))
+        
+        # Rotation matrices for integer degrees in [-15, 15], built once:
+        # the center never changes, so the augmentation hot path just
+        # indexes the table instead of redoing trig per frame
+        center = (self.frame_size[1] // 2, self.frame_size[0] // 2)
+        self._rot_matrices = [cv2.getRotationMatrix2D(center, angle, 1.0)
+                              for angle in range(-15, 16)]
         self.block_size = config.get('block_size', 8)
         self.num_blocks = (self.frame_size[0] // self.block_size) * (self.frame_size[1] // self.block_size)
         
@@ -60,98 +98,208 @@ class WatermarkDataGenerator:
         """
         logger.info(f"Generating {num_samples} synthetic samples...")
         
-        X = np.zeros((num_samples, *self.frame_size, 3), dtype=np.float32)
-        y = np.zeros(num_samples, dtype=np.int32)
+        X, y = self._generate_synthetic_batch(num_samples)
         
-        for i in range(num_samples):
-            # Generate random frame
-            frame = self._generate_random_frame()
-            
-            # Randomly decide if this frame should have a watermark
-            has_watermark = random.random() < self.watermark_probability
-            
-            if has_watermark:
-                frame = self._apply_synthetic_watermark(frame)
-                y[i] = 1
-            else:
-                y[i] = 0
+        logger.info(f"Generated {num_samples} samples: {np.sum(y)} watermarked, {num_samples - np.sum(y)} non-watermarked")
+        return X, y
+    
+    def _generate_synthetic_batch(self, num_samples: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Generate, watermark and augment one batch of synthetic samples."""
+        # Generate and watermark whole batches at once instead of per-sample loops
+        X = self._generate_random_frames(num_samples)
+        y = (self.rng.random(num_samples) < self.watermark_probability).astype(np.int32)
+        
+        watermarked = np.flatnonzero(y)
+        if watermarked.size > 0:
+            X[watermarked] = self._apply_synthetic_watermark_batch(X[watermarked])
+        
+        # Apply data augmentation
+        if self.augmentation_enabled:
+            X = self._augment_batch(X)
+        
+        return X, y
+    
+    def stream_synthetic_data(self, num_samples: int,
+                              batch_size: int = 256) -> Generator[Tuple[np.ndarray, np.ndarray], None, None]:
+        """
+        Generate synthetic data one batch at a time.
+        
+        Peak memory stays at one batch regardless of num_samples, where
+        generate_synthetic_data materializes the full array up front
+        (~5 GB for 100k 64x64 float32 frames).
+        
+        Args:
+            num_samples: Total number of samples to generate
+            batch_size: Samples per yielded batch
             
-            # Apply data augmentation
-            if self.augmentation_enabled:
-                frame = self._augment_frame(frame)
+        Yields:
+            Batches of (X_batch, y_batch)
+        """
+        for start in range(0, num_samples, batch_size):
+            yield self._generate_synthetic_batch(min(batch_size, num_samples - start))
+    
+    def make_synthetic_tf_dataset(self, num_samples: int, batch_size: int = 32):
+        """
+        Build a tf.data pipeline over streamed synthetic batches.
+        
+        Generation runs in the pipeline's background threads, overlapping
+        with training, and nothing larger than one batch is ever resident.
+        
+        Args:
+            num_samples: Total number of samples to generate per epoch
+            batch_size: Samples per batch
             
-            X[i] = frame
+        Returns:
+            A prefetched tf.data.Dataset of (frames, labels) batches
+        """
+        import tensorflow as tf  # local import keeps the generator usable without TF
+        
+        h, w = self.frame_size
+        return tf.data.Dataset.from_generator(
+            lambda: self.stream_synthetic_data(num_samples, batch_size),
+            output_signature=(
+                tf.TensorSpec(shape=(None, h, w, 3), dtype=tf.float32),
+                tf.TensorSpec(shape=(None,), dtype=tf.int32)
+            )
+        ).prefetch(tf.data.AUTOTUNE)
+    
+    def _generate_random_frames(self, num_frames: int) -> np.ndarray:
+        """Generate a batch of random video frames in one vectorized pass."""
+        h, w = self.frame_size
+        frames = self.rng.random((num_frames, h, w, 3), dtype=np.float32)
+        
+        # Add horizontal and vertical line structure
+        frames[:, ::16, :, :] += 0.1
+        frames[:, :, ::16, :] += 0.1
+        
+        # Add random bright blocks (scatter-add so overlaps accumulate)
+        counts = self.rng.integers(5, 16, size=num_frames)
+        frame_idx = np.repeat(np.arange(num_frames), counts)
+        total = frame_idx.shape[0]
+        xs = self.rng.integers(0, h - 7, size=total)
+        ys = self.rng.integers(0, w - 7, size=total)
+        intensity = self.rng.uniform(0.1, 0.3, size=total).astype(np.float32)
+        
+        off = np.arange(8)
+        np.add.at(
+            frames,
+            (frame_idx[:, None, None],
+             xs[:, None, None] + off[None, :, None],
+             ys[:, None, None] + off[None, None, :]),
+            intensity[:, None, None, None]
+        )
+        
+        np.clip(frames, 0, 1, out=frames)
+        return frames
+    
+    def _apply_synthetic_watermark_batch(self, frames: np.ndarray) -> np.ndarray:
+        """Apply synthetic watermarks to a batch of frames in place."""
+        bs = self.block_size
+        
+        if NUMBA_AVAILABLE:
+            # JIT kernel: parallel over frames, clamp fused into the block add
+            _apply_wm_batch_numba(
+                frames, bs,
+                float(self.qp_delta_range[0]), float(self.qp_delta_range[1]),
+                int(self.rng.integers(0, 2 ** 31 - 1))
+            )
+            return frames
         
-        logger.info(f"Generated {num_samples} samples: {np.sum(y)} watermarked, {num_samples - np.sum(y)} non-watermarked")
-        return X, y
+        n = frames.shape[0]
+        bh, bw = self.frame_size[0] // bs, self.frame_size[1] // bs
+        
+        # 30% of blocks per frame get a simulated QP-delta intensity change;
+        # the mask is applied branchlessly by multiplying with the bool array
+        # (0/1) in place instead of materializing an np.where temporary
+        delta = self.rng.uniform(*self.qp_delta_range, size=(n, bh, bw)).astype(np.float32)
+        delta *= np.float32(0.05)
+        delta *= self.rng.random((n, bh, bw)) < 0.3
+        
+        # Upsample block deltas to pixel resolution and apply in a single add
+        delta = np.repeat(np.repeat(delta, bs, axis=1), bs, axis=2)
+        frames[:, :bh * bs, :bw * bs, :] += delta[..., None]
+        np.clip(frames, 0, 1, out=frames)
+        return frames
     
     def _generate_random_frame(self) -> np.ndarray:
         """Generate a random video frame."""
         # Create base frame with random content
-        frame = np.random.rand(*self.frame_size, 3).astype(np.float32)
+        frame = self.rng.random((*self.frame_size, 3), dtype=np.float32)
         
         # Add some structure to make it more realistic
-        # Add horizontal and vertical lines
-        for i in range(0, self.frame_size[0], 16):
-            frame[i, :, :] += 0.1
-        for j in range(0, self.frame_size[1], 16):
-            frame[:, j, :] += 0.1
-        
-        # Add some random blocks
-        for _ in range(random.randint(5, 15)):
-            x = random.randint(0, self.frame_size[0] - 8)
-            y = random.randint(0, self.frame_size[1] - 8)
-            intensity = random.uniform(0.1, 0.3)
+        # Horizontal and vertical lines via strided slices
+        frame[::16, :, :] += 0.1
+        frame[:, ::16, :] += 0.1
+        
+        # Add some random blocks (coordinates and intensities drawn in one shot)
+        num_blocks = int(self.rng.integers(5, 16))
+        xs = self.rng.integers(0, self.frame_size[0] - 7, size=num_blocks)
+        ys = self.rng.integers(0, self.frame_size[1] - 7, size=num_blocks)
+        intensities = self.rng.uniform(0.1, 0.3, size=num_blocks).astype(np.float32)
+        for x, y, intensity in zip(xs, ys, intensities):
             frame[x:x+8, y:y+8, :] += intensity
         
-        # Normalize to [0, 1]
-        frame = np.clip(frame, 0, 1)
+        # Normalize to [0, 1] once at the end
+        np.clip(frame, 0, 1, out=frame)
         return frame
     
     def _apply_synthetic_watermark(self, frame: np.ndarray) -> np.ndarray:
         """Apply synthetic watermark to a frame."""
-        # Simulate QP variations by modifying block intensities
-        for i in range(0, self.frame_size[0], self.block_size):
-            for j in range(0, self.frame_size[1], self.block_size):
-                if random.random() < 0.3:  # 30% of blocks get watermarked
-                    # Simulate QP delta effect
-                    qp_delta = random.uniform(*self.qp_delta_range)
-                    intensity_change = qp_delta * 0.05  # Small intensity change
-                    
-                    block = frame[i:i+self.block_size, j:j+self.block_size, :]
-                    frame[i:i+self.block_size, j:j+self.block_size, :] = np.clip(
-                        block + intensity_change, 0, 1
-                    )
+        # Single-frame convenience wrapper over the branchless batch kernel
+        return self._apply_synthetic_watermark_batch(frame[None])[0]
+    
+    def _augment_batch(self, frames: np.ndarray) -> np.ndarray:
+        """Apply data augmentation to a whole batch with tensor ops."""
+        n = frames.shape[0]
         
-        return frame
+        # Noise, per-sample brightness and contrast fused into one expression
+        # with a single final clip: one pass over the tensor instead of three
+        if self.noise_level > 0:
+            noise = self.rng.standard_normal(frames.shape, dtype=np.float32) * np.float32(self.noise_level)
+            frames = frames + noise
+        brightness = self.rng.uniform(*self.brightness_range, size=n).astype(np.float32)
+        contrast = self.rng.uniform(*self.contrast_range, size=n).astype(np.float32)
+        frames = frames * brightness[:, None, None, None]
+        mean_intensity = frames.mean(axis=(1, 2, 3), keepdims=True)
+        frames = (frames - mean_intensity) * contrast[:, None, None, None] + mean_intensity
+        np.clip(frames, 0, 1, out=frames)
+        
+        # Random horizontal flips in one fancy-indexed assignment
+        flip = self.rng.random(n) < 0.5
+        frames[flip] = frames[flip, :, ::-1]
+        
+        # Small random rotations stay per-frame (no batched warp in OpenCV);
+        # angles quantize to integer degrees so the matrices come from the
+        # precomputed table
+        for idx in np.flatnonzero(self.rng.random(n) < 0.3):
+            matrix = self._rot_matrices[self.rng.integers(0, len(self._rot_matrices))]
+            frames[idx] = cv2.warpAffine(
+                frames[idx], matrix, (self.frame_size[1], self.frame_size[0])
+            )
+        
+        return frames
     
     def _augment_frame(self, frame: np.ndarray) -> np.ndarray:
         """Apply data augmentation to a frame."""
-        # Add noise
+        # Noise, brightness and contrast fused with a single final clip:
+        # one full-tensor pass instead of three clipped rewrites
         if self.noise_level > 0:
-            noise = np.random.normal(0, self.noise_level, frame.shape)
-            frame = np.clip(frame + noise, 0, 1)
-        
-        # Adjust brightness
-        if self.brightness_range != (1.0, 1.0):
-            brightness_factor = random.uniform(*self.brightness_range)
-            frame = np.clip(frame * brightness_factor, 0, 1)
-        
-        # Adjust contrast
-        if self.contrast_range != (1.0, 1.0):
-            contrast_factor = random.uniform(*self.contrast_range)
-            mean_intensity = np.mean(frame)
-            frame = np.clip((frame - mean_intensity) * contrast_factor + mean_intensity, 0, 1)
+            noise = self.rng.standard_normal(frame.shape, dtype=np.float32) * np.float32(self.noise_level)
+            frame = frame + noise
+        brightness_factor = self.rng.uniform(*self.brightness_range)
+        contrast_factor = self.rng.uniform(*self.contrast_range)
+        frame = frame * np.float32(brightness_factor)
+        mean_intensity = frame.mean()
+        frame = (frame - mean_intensity) * np.float32(contrast_factor) + mean_intensity
+        np.clip(frame, 0, 1, out=frame)
         
         # Random horizontal flip
-        if random.random() < 0.5:
+        if self.rng.random() < 0.5:
             frame = np.fliplr(frame)
         
-        # Random rotation (small angles)
-        if random.random() < 0.3:
-            angle = random.uniform(-15, 15)
-            center = (self.frame_size[1] // 2, self.frame_size[0] // 2)
-            matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+        # Random rotation (small angles, integer degrees from the table)
+        if self.rng.random() < 0.3:
+            matrix = self._rot_matrices[self.rng.integers(0, len(self._rot_matrices))]
             frame = cv2.warpAffine(frame, matrix, (self.frame_size[1], self.frame_size[0]))
         
         return frame
@@ -169,30 +317,51 @@ class WatermarkDataGenerator:
         """
         logger.info(f"Loading video data from {len(video_paths)} files...")
         
-        all_frames = []
-        all_labels = []
-        
+        pairs = []
         for video_path, label in zip(video_paths, labels):
-            if not os.path.exists(video_path):
+            if os.path.exists(video_path):
+                pairs.append((video_path, label))
+            else:
                 logger.warning(f"Video file not found: {video_path}")
-                continue
-            
-            frames = self._extract_frames_from_video(video_path)
-            all_frames.extend(frames)
-            all_labels.extend([label] * len(frames))
         
-        if not all_frames:
+        # Preallocate for the worst case (matches _extract_frames_from_video's
+        # max_frames default); untouched tail pages are never committed, and
+        # frames copy straight into place with no list -> np.array pass
+        max_per_video = 100
+        X = np.empty((len(pairs) * max_per_video, *self.frame_size, 3), dtype=np.float32)
+        y = np.empty(len(pairs) * max_per_video, dtype=np.int32)
+        count = 0
+        
+        if pairs:
+            # FFmpeg decode releases the GIL, so threads overlap decode and
+            # disk I/O; keep OpenCV single-threaded to avoid oversubscription
+            prev_threads = cv2.getNumThreads()
+            cv2.setNumThreads(1)
+            try:
+                with ThreadPoolExecutor(max_workers=min(len(pairs), os.cpu_count() or 1)) as executor:
+                    results = executor.map(
+                        self._extract_frames_from_video, [path for path, _ in pairs]
+                    )
+                    for (video_path, label), frames in zip(pairs, results):
+                        for frame in frames:
+                            X[count] = frame
+                            y[count] = label
+                            count += 1
+            finally:
+                cv2.setNumThreads(prev_threads)
+        
+        if count == 0:
             raise ValueError("No frames could be extracted from the provided video files")
         
-        # Convert to numpy arrays
-        X = np.array(all_frames, dtype=np.float32)
-        y = np.array(all_labels, dtype=np.int32)
+        X = X[:count]
+        y = y[:count]
         
         logger.info(f"Loaded {len(X)} frames from videos")
         return X, y
     
-    def _extract_frames_from_video(self, video_path: str, max_frames: int = 100) -> List[np.ndarray]:
-        """Extract frames from a video file."""
+    def _extract_frames_from_video(self, video_path: str, max_frames: int = 100,
+                                    frame_stride: int = 3) -> List[np.ndarray]:
+        """Extract every frame_stride-th frame from a video file."""
         frames = []
         cap = cv2.VideoCapture(video_path)
         
@@ -200,30 +369,112 @@ class WatermarkDataGenerator:
             logger.warning(f"Could not open video: {video_path}")
             return frames
         
-        frame_count = 0
-        while len(frames) < max_frames:
+        # Reused conversion buffers: no astype/cvtColor temporaries per frame
+        u8_buf = np.empty((*self.frame_size, 3), dtype=np.uint8)
+        f32_buf = np.empty((*self.frame_size, 3), dtype=np.float32)
+        
+        eof = False
+        while len(frames) < max_frames and not eof:
             ret, frame = cap.read()
             if not ret:
                 break
             
-            # Resize frame to target size
-            frame = cv2.resize(frame, self.frame_size)
-            
-            # Convert BGR to RGB and normalize to [0, 1]
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = frame.astype(np.float32) / 255.0
+            # Resize into the reused uint8 buffer, then swap BGR->RGB via a
+            # reversed-channel view and scale to [0, 1] in a single pass
+            cv2.resize(frame, self.frame_size, dst=u8_buf)
+            np.multiply(u8_buf[..., ::-1], np.float32(1.0 / 255.0), out=f32_buf)
             
-            frames.append(frame)
-            frame_count += 1
+            frames.append(f32_buf.copy())
             
-            # Skip some frames to get variety
-            if frame_count % 3 == 0:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count + 2)
+            # Skip intermediate frames with grab(): no decode, no seek
+            for _ in range(frame_stride - 1):
+                if not cap.grab():
+                    eof = True
+                    break
         
         cap.release()
         logger.info(f"Extracted {len(frames)} frames from {video_path}")
         return frames
     
+    def make_tf_dataset(self, X: np.ndarray, y: np.ndarray,
+                        batch_size: int = 32, shuffle: bool = True,
+                        augment: bool = False):
+        """
+        Build a tf.data pipeline over the data.
+        
+        Preferred over create_data_generator for feeding model.fit: batches
+        are assembled and copied to the device in background threads instead
+        of per-batch Python code.
+        
+        Args:
+            X: Input data
+            y: Labels
+            batch_size: Batch size for training
+            shuffle: Whether to shuffle the data
+            augment: Apply noise/brightness/contrast/flip/rotation
+                augmentation as fused tensor ops on whole batches inside
+                the pipeline
+            
+        Returns:
+            A cached, batched, prefetched tf.data.Dataset
+        """
+        import tensorflow as tf  # local import keeps the generator usable without TF
+        
+        dataset = tf.data.Dataset.from_tensor_slices((X, y)).cache()
+        if shuffle:
+            dataset = dataset.shuffle(min(len(X), 10000))
+        dataset = dataset.batch(batch_size)
+        
+        if X.dtype == np.uint8:
+            # Quantized storage: shuffle buffer and cache hold uint8 (4x
+            # smaller); rescale to float32 per batch on the way out
+            dataset = dataset.map(
+                lambda x, labels: (tf.cast(x, tf.float32) / 255.0, labels),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+        
+        if augment:
+            noise_level = self.noise_level
+            b_lo, b_hi = self.brightness_range
+            c_lo, c_hi = self.contrast_range
+            max_rot = np.float32(np.radians(15.0))
+            
+            def rotate_batch(x, n):
+                # One ImageProjectiveTransformV3 call rotates the whole batch;
+                # ~30% of frames get a random +/-15 degree angle, the rest a
+                # zero angle (identity transform), matching the numpy path
+                angles = tf.random.uniform([n], -max_rot, max_rot)
+                angles = angles * tf.cast(tf.random.uniform([n]) < 0.3, tf.float32)
+                cos, sin = tf.cos(angles), tf.sin(angles)
+                h = tf.cast(tf.shape(x)[1], tf.float32)
+                w = tf.cast(tf.shape(x)[2], tf.float32)
+                cx, cy = (w - 1.0) / 2.0, (h - 1.0) / 2.0
+                tx = cx - cx * cos + cy * sin
+                ty = cy - cx * sin - cy * cos
+                zeros = tf.zeros_like(cos)
+                transforms = tf.stack([cos, -sin, tx, sin, cos, ty, zeros, zeros], axis=1)
+                return tf.raw_ops.ImageProjectiveTransformV3(
+                    images=x, transforms=transforms,
+                    output_shape=tf.shape(x)[1:3],
+                    fill_value=0.0, interpolation='BILINEAR')
+            
+            def augment_batch(x, labels):
+                # Mapped after batch(): each op runs once per batch on-device,
+                # overlapping the previous training step
+                n = tf.shape(x)[0]
+                x = tf.image.random_flip_left_right(x)
+                x = rotate_batch(x, n)
+                x = x * tf.random.uniform([n, 1, 1, 1], b_lo, b_hi)
+                mean = tf.reduce_mean(x, axis=[1, 2, 3], keepdims=True)
+                x = (x - mean) * tf.random.uniform([n, 1, 1, 1], c_lo, c_hi) + mean
+                if noise_level > 0:
+                    x = x + tf.random.normal(tf.shape(x), stddev=noise_level)
+                return tf.clip_by_value(x, 0.0, 1.0), labels
+            
+            dataset = dataset.map(augment_batch, num_parallel_calls=tf.data.AUTOTUNE)
+        
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    
     def create_data_generator(self, 
                             X: np.ndarray, 
                             y: np.ndarray, 
@@ -242,19 +493,21 @@ class WatermarkDataGenerator:
             Batches of (X_batch, y_batch)
         """
         num_samples = len(X)
-        indices = np.arange(num_samples)
         
         if shuffle:
-            np.random.shuffle(indices)
+            # Permute once into contiguous buffers; every batch is then a
+            # zero-copy contiguous slice instead of a strided gather
+            perm = self.rng.permutation(num_samples)
+            X = X[perm]
+            y = y[perm]
         
+        rescale = X.dtype == np.uint8
         for start_idx in range(0, num_samples, batch_size):
             end_idx = min(start_idx + batch_size, num_samples)
-            batch_indices = indices[start_idx:end_idx]
-            
-            X_batch = X[batch_indices]
-            y_batch = y[batch_indices]
-            
-            yield X_batch, y_batch
+            X_batch = X[start_idx:end_idx]
+            if rescale:
+                X_batch = X_batch.astype(np.float32) / np.float32(255.0)
+            yield X_batch, y[start_idx:end_idx]
     
     def split_data(self, X: np.ndarray, y: np.ndarray, 
                    train_ratio: float = 0.7, 
@@ -279,7 +532,7 @@ class WatermarkDataGenerator:
         
         num_samples = len(X)
         indices = np.arange(num_samples)
-        np.random.shuffle(indices)
+        self.rng.shuffle(indices)
         
         train_end = int(train_ratio * num_samples)
         val_end = train_end + int(val_ratio * num_samples)
@@ -296,7 +549,8 @@ class WatermarkDataGenerator:
         
         return train_data, val_data, test_data
     
-    def save_data(self, X: np.ndarray, y: np.ndarray, output_dir: str, prefix: str = "data") -> None:
+    def save_data(self, X: np.ndarray, y: np.ndarray, output_dir: str, prefix: str = "data",
+                  shard_size: Optional[int] = None, quantize: bool = True) -> None:
         """
         Save generated data to disk.
         
@@ -305,12 +559,33 @@ class WatermarkDataGenerator:
             y: Labels
             output_dir: Directory to save data
             prefix: Prefix for filenames
+            shard_size: If set, split the arrays into shards of this many
+                samples so they can be memory-mapped and streamed one at a time
+            quantize: Store float frames as uint8 (round(x * 255)), a 4x
+                smaller footprint on disk and when memory-mapped back; the
+                batch pipelines rescale to float32 on the way to the model
         """
         os.makedirs(output_dir, exist_ok=True)
         
-        # Save as numpy arrays
-        np.save(os.path.join(output_dir, f"{prefix}_X.npy"), X)
-        np.save(os.path.join(output_dir, f"{prefix}_y.npy"), y)
+        if quantize and np.issubdtype(X.dtype, np.floating):
+            def encode(frames):
+                return np.round(frames * np.float32(255.0)).astype(np.uint8)
+        else:
+            def encode(frames):
+                return frames
+        
+        # Save as numpy arrays (shards are encoded one at a time, so
+        # quantizing never needs a full-size temporary)
+        num_shards = None
+        if shard_size:
+            num_shards = (len(X) + shard_size - 1) // shard_size
+            for i in range(num_shards):
+                shard = slice(i * shard_size, (i + 1) * shard_size)
+                np.save(os.path.join(output_dir, f"{prefix}_X_{i:05d}.npy"), encode(X[shard]))
+                np.save(os.path.join(output_dir, f"{prefix}_y_{i:05d}.npy"), y[shard])
+        else:
+            np.save(os.path.join(output_dir, f"{prefix}_X.npy"), encode(X))
+            np.save(os.path.join(output_dir, f"{prefix}_y.npy"), y)
         
         # Save metadata
         metadata = {
@@ -318,7 +593,10 @@ class WatermarkDataGenerator:
             'frame_size': self.frame_size,
             'block_size': self.block_size,
             'watermark_probability': self.watermark_probability,
-            'augmentation_enabled': self.augmentation_enabled
+            'augmentation_enabled': self.augmentation_enabled,
+            'shard_size': shard_size,
+            'num_shards': num_shards,
+            'dtype': str(encode(X[:0]).dtype)
         }
         
         import json
@@ -327,25 +605,72 @@ class WatermarkDataGenerator:
         
         logger.info(f"Data saved to {output_dir}")
     
-    def load_data(self, data_dir: str, prefix: str = "data") -> Tuple[np.ndarray, np.ndarray]:
+    def _read_num_shards(self, data_dir: str, prefix: str) -> Optional[int]:
+        """Read the shard count from a dataset's metadata, if any."""
+        import json
+        meta_path = os.path.join(data_dir, f"{prefix}_metadata.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r') as f:
+            return json.load(f).get('num_shards')
+    
+    def iter_data_shards(self, data_dir: str,
+                         prefix: str = "data") -> Generator[Tuple[np.ndarray, np.ndarray], None, None]:
+        """
+        Yield memory-mapped (X, y) shards one at a time.
+        
+        Streaming consumers (e.g. a tf.data pipeline built per shard) touch
+        only one shard's pages at a time instead of the whole dataset.
+        """
+        num_shards = self._read_num_shards(data_dir, prefix)
+        if not num_shards:
+            yield self.load_data(data_dir, prefix, mmap=True)
+            return
+        
+        for i in range(num_shards):
+            yield (
+                np.load(os.path.join(data_dir, f"{prefix}_X_{i:05d}.npy"), mmap_mode='r'),
+                np.load(os.path.join(data_dir, f"{prefix}_y_{i:05d}.npy"), mmap_mode='r')
+            )
+    
+    def load_data(self, data_dir: str, prefix: str = "data",
+                  mmap: bool = False) -> Tuple[np.ndarray, np.ndarray]:
         """
         Load saved data from disk.
         
         Args:
             data_dir: Directory containing saved data
             prefix: Prefix for filenames
+            mmap: Memory-map the arrays instead of reading them into RAM
             
         Returns:
             Tuple of (X, y)
         """
+        mmap_mode = 'r' if mmap else None
+        
+        num_shards = self._read_num_shards(data_dir, prefix)
+        if num_shards:
+            # Sharded layout: concatenating materializes the result, so use
+            # iter_data_shards instead when streaming is the point
+            X = np.concatenate([
+                np.load(os.path.join(data_dir, f"{prefix}_X_{i:05d}.npy"), mmap_mode=mmap_mode)
+                for i in range(num_shards)
+            ], axis=0)
+            y = np.concatenate([
+                np.load(os.path.join(data_dir, f"{prefix}_y_{i:05d}.npy"), mmap_mode=mmap_mode)
+                for i in range(num_shards)
+            ], axis=0)
+            logger.info(f"Loaded data: {len(X)} samples from {num_shards} shards in {data_dir}")
+            return X, y
+        
         X_path = os.path.join(data_dir, f"{prefix}_X.npy")
         y_path = os.path.join(data_dir, f"{prefix}_y.npy")
         
         if not os.path.exists(X_path) or not os.path.exists(y_path):
             raise FileNotFoundError(f"Data files not found in {data_dir}")
         
-        X = np.load(X_path)
-        y = np.load(y_path)
+        X = np.load(X_path, mmap_mode=mmap_mode)
+        y = np.load(y_path, mmap_mode=mmap_mode)
         
         logger.info(f"Loaded data: {len(X)} samples from {data_dir}")
         return X, y
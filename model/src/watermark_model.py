@@ -34,6 +34,7 @@ class WatermarkDetectionModel:
         self.config = config
         self.model = None
         self.history = None
+        self._infer = None
         
         # Model architecture parameters
         self.input_shape = config.get('input_shape', (64, 64, 3))
@@ -41,6 +42,19 @@ class WatermarkDetectionModel:
         self.learning_rate = config.get('learning_rate', 0.001)
         self.dropout_rate = config.get('dropout_rate', 0.3)
         
+        # Mixed precision: half-precision activations, float32 softmax/loss.
+        # Optimizer state (Adam m/v slots) stays float32 either way since
+        # Keras keeps variables in float32 under the mixed_float16 policy.
+        self.mixed_precision = config.get('mixed_precision', True)
+        if self.mixed_precision:
+            keras.mixed_precision.set_global_policy('mixed_float16')
+        
+        # XLA autoclustering fuses conv/bias/relu/pool chains into single
+        # kernels, cutting memory traffic through the trunk
+        self.jit_compile = config.get('jit_compile', True)
+        if self.jit_compile:
+            tf.config.optimizer.set_jit("autoclustering")
+        
         # Feature extraction parameters
         self.block_size = config.get('block_size', 8)
         self.dct_size = config.get('dct_size', 8)
@@ -59,17 +73,11 @@ class WatermarkDetectionModel:
         # Input layer
         inputs = layers.Input(shape=self.input_shape)
         
-        # Feature extraction branch - QP analysis
-        qp_branch = self._build_qp_branch(inputs)
-        
-        # Feature extraction branch - DCT coefficients
-        dct_branch = self._build_dct_branch(inputs)
-        
-        # Feature extraction branch - Statistical features
-        stats_branch = self._build_stats_branch(inputs)
+        # Shared depthwise-separable trunk (one feature pyramid over the input)
+        trunk = self._build_trunk(inputs)
         
-        # Concatenate all feature branches
-        merged = layers.Concatenate()([qp_branch, dct_branch, stats_branch])
+        # Multi-kernel reception only at the deepest, cheapest resolution
+        merged = self._build_multiscale_head(trunk)
         
         # Dense layers for classification
         x = layers.Dense(512, activation='relu')(merged)
@@ -79,51 +87,45 @@ class WatermarkDetectionModel:
         x = layers.Dense(128, activation='relu')(x)
         x = layers.Dropout(self.dropout_rate)(x)
         
-        # Output layer
-        outputs = layers.Dense(self.num_classes, activation='softmax')(x)
+        # Output layer (softmax kept in float32 for numerical stability)
+        x = layers.Dense(self.num_classes)(x)
+        outputs = layers.Activation('softmax', dtype='float32')(x)
         
         # Create model
         self.model = models.Model(inputs=inputs, outputs=outputs)
+        self._infer = None
         
-        # Compile model
+        # Compile model (loss scaling guards float16 gradients from underflow)
+        optimizer = optimizers.Adam(learning_rate=self.learning_rate)
+        if self.mixed_precision:
+            optimizer = keras.mixed_precision.LossScaleOptimizer(optimizer)
         self.model.compile(
-            optimizer=optimizers.Adam(learning_rate=self.learning_rate),
+            optimizer=optimizer,
             loss='sparse_categorical_crossentropy',
-            metrics=['accuracy', 'precision', 'recall']
+            metrics=['accuracy', 'precision', 'recall'],
+            jit_compile=self.jit_compile
         )
         
         logger.info("Model built successfully")
         return self.model
     
-    def _build_qp_branch(self, inputs: tf.Tensor) -> tf.Tensor:
-        """Build branch for QP variation analysis."""
-        x = layers.Conv2D(32, (3, 3), activation='relu', padding='same')(inputs)
-        x = layers.MaxPooling2D((2, 2))(x)
-        x = layers.Conv2D(64, (3, 3), activation='relu', padding='same')(x)
-        x = layers.MaxPooling2D((2, 2))(x)
-        x = layers.Conv2D(128, (3, 3), activation='relu', padding='same')(x)
-        x = layers.GlobalAveragePooling2D()(x)
-        return x
-    
-    def _build_dct_branch(self, inputs: tf.Tensor) -> tf.Tensor:
-        """Build branch for DCT coefficient analysis."""
-        x = layers.Conv2D(32, (5, 5), activation='relu', padding='same')(inputs)
+    def _build_trunk(self, inputs: tf.Tensor) -> tf.Tensor:
+        """Build the shared depthwise-separable convolution trunk."""
+        x = layers.SeparableConv2D(32, (3, 3), activation='relu', padding='same')(inputs)
         x = layers.MaxPooling2D((2, 2))(x)
-        x = layers.Conv2D(64, (5, 5), activation='relu', padding='same')(x)
+        x = layers.SeparableConv2D(64, (3, 3), activation='relu', padding='same')(x)
         x = layers.MaxPooling2D((2, 2))(x)
-        x = layers.Conv2D(128, (5, 5), activation='relu', padding='same')(x)
-        x = layers.GlobalAveragePooling2D()(x)
+        x = layers.SeparableConv2D(128, (3, 3), activation='relu', padding='same')(x)
         return x
     
-    def _build_stats_branch(self, inputs: tf.Tensor) -> tf.Tensor:
-        """Build branch for statistical feature analysis."""
-        x = layers.Conv2D(32, (7, 7), activation='relu', padding='same')(inputs)
-        x = layers.MaxPooling2D((2, 2))(x)
-        x = layers.Conv2D(64, (7, 7), activation='relu', padding='same')(x)
-        x = layers.MaxPooling2D((2, 2))(x)
-        x = layers.Conv2D(128, (7, 7), activation='relu', padding='same')(x)
-        x = layers.GlobalAveragePooling2D()(x)
-        return x
+    def _build_multiscale_head(self, x: tf.Tensor) -> tf.Tensor:
+        """Build the multi-kernel head applied at the deepest layer."""
+        scales = [
+            layers.Conv2D(64, (k, k), activation='relu', padding='same')(x)
+            for k in (3, 5, 7)
+        ]
+        merged = layers.Concatenate()(scales)
+        return layers.GlobalAveragePooling2D()(merged)
     
     def train(self, 
               train_data: Tuple[np.ndarray, np.ndarray],
@@ -167,12 +169,30 @@ class WatermarkDetectionModel:
                 )
             ]
         
+        # Feed training through a prefetched tf.data pipeline. Quantized
+        # uint8 datasets stay uint8 through cache/shuffle (4x smaller) and
+        # are rescaled to float32 per batch on the way to the model
+        autotune = tf.data.AUTOTUNE
+        
+        def rescale(ds, dtype):
+            if dtype == np.uint8:
+                ds = ds.map(lambda x, labels: (tf.cast(x, tf.float32) / 255.0, labels),
+                            num_parallel_calls=autotune)
+            return ds
+        
+        train_ds = (tf.data.Dataset.from_tensor_slices((X_train, y_train))
+                    .cache()
+                    .shuffle(min(len(X_train), 10000))
+                    .batch(batch_size))
+        train_ds = rescale(train_ds, X_train.dtype).prefetch(autotune)
+        val_ds = tf.data.Dataset.from_tensor_slices((X_val, y_val)).batch(batch_size)
+        val_ds = rescale(val_ds, X_val.dtype).prefetch(autotune)
+        
         # Train the model
         self.history = self.model.fit(
-            X_train, y_train,
-            validation_data=(X_val, y_val),
+            train_ds,
+            validation_data=val_ds,
             epochs=epochs,
-            batch_size=batch_size,
             callbacks=callbacks,
             verbose=1
         )
@@ -180,6 +200,13 @@ class WatermarkDetectionModel:
         logger.info("Training completed successfully")
         return self.history
     
+    @staticmethod
+    def _as_model_input(X: np.ndarray) -> np.ndarray:
+        """Rescale quantized uint8 frames to the model's float [0, 1] contract."""
+        if X.dtype == np.uint8:
+            return X.astype(np.float32) / np.float32(255.0)
+        return X
+    
     def predict(self, X: np.ndarray) -> np.ndarray:
         """
         Make predictions on new data.
@@ -193,7 +220,18 @@ class WatermarkDetectionModel:
         if self.model is None:
             raise ValueError("Model not built or loaded. Call build_model() or load_model() first.")
         
-        return self.model.predict(X)
+        X = self._as_model_input(X)
+        
+        if self._infer is None:
+            # Trace the forward pass once with a free batch dimension; later
+            # calls reuse the same graph regardless of batch size, skipping
+            # Model.predict's per-call dispatch and progress-bar overhead
+            self._infer = tf.function(
+                lambda x: self.model(x, training=False),
+                input_signature=[tf.TensorSpec((None, *self.input_shape), tf.float32)]
+            )
+        
+        return self._infer(tf.convert_to_tensor(X, dtype=tf.float32)).numpy()
     
     def evaluate(self, X: np.ndarray, y: np.ndarray) -> Dict[str, float]:
         """
@@ -209,7 +247,7 @@ class WatermarkDetectionModel:
         if self.model is None:
             raise ValueError("Model not built or loaded. Call build_model() or load_model() first.")
         
-        results = self.model.evaluate(X, y, verbose=0)
+        results = self.model.evaluate(self._as_model_input(X), y, verbose=0)
         metrics = dict(zip(self.model.metrics_names, results))
         
         logger.info(f"Model evaluation results: {metrics}")
@@ -240,6 +278,7 @@ class WatermarkDetectionModel:
             raise FileNotFoundError(f"Model file not found: {filepath}")
         
         self.model = keras.models.load_model(filepath)
+        self._infer = None
         logger.info(f"Model loaded from {filepath}")
     
     def get_model_summary(self) -> str:
@@ -257,12 +296,72 @@ class WatermarkDetectionModel:
         self.model.summary(print_fn=lambda x: summary_list.append(x))
         return '\n'.join(summary_list)
     
-    def export_for_tensorflowjs(self, output_dir: str) -> None:
+    def export_for_tflite(self, output_path: str,
+                          representative_data: Optional[np.ndarray] = None) -> None:
+        """
+        Export an INT8-quantized TensorFlow Lite model.
+        
+        Args:
+            output_path: Path for the .tflite file
+            representative_data: Sample inputs used to calibrate int8 quantization
+        """
+        if self.model is None:
+            raise ValueError("No model to export. Train or load a model first.")
+        
+        export_model = self.model
+        policy = keras.mixed_precision.global_policy()
+        if policy.name != 'float32':
+            # The TFLite converter cannot lower float16 compute ops (the
+            # separable convs fail as "neither a custom op nor a flex op"),
+            # so convert from a float32 clone of the model instead; weights
+            # transfer directly since variables are float32 under mixed
+            # precision
+            keras.mixed_precision.set_global_policy('float32')
+            try:
+                def _to_float32(layer):
+                    config = layer.get_config()
+                    config['dtype'] = 'float32'
+                    return layer.__class__.from_config(config)
+                
+                export_model = keras.models.clone_model(self.model,
+                                                        clone_function=_to_float32)
+                export_model.set_weights(self.model.get_weights())
+            finally:
+                keras.mixed_precision.set_global_policy(policy)
+        
+        converter = tf.lite.TFLiteConverter.from_keras_model(export_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        
+        if representative_data is not None:
+            def representative_dataset():
+                for i in range(min(len(representative_data), 100)):
+                    sample = self._as_model_input(representative_data[i:i + 1])
+                    yield [sample.astype(np.float32)]
+            
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        
+        tflite_model = converter.convert()
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'wb') as f:
+            f.write(tflite_model)
+        
+        logger.info(f"TFLite model exported to {output_path} ({len(tflite_model)} bytes)")
+    
+    def export_for_tensorflowjs(self, output_dir: str,
+                                representative_data: Optional[np.ndarray] = None) -> None:
         """
         Export model for TensorFlow.js deployment.
         
+        When calibration data is supplied, an int8-quantized TFLite sibling
+        (model_int8.tflite) is written next to the web model for on-device
+        detection.
+        
         Args:
             output_dir: Directory to save the exported model
+            representative_data: Optional sample inputs for int8 calibration
         """
         if self.model is None:
             raise ValueError("No model to export. Train or load a model first.")
@@ -275,3 +374,7 @@ class WatermarkDetectionModel:
         except ImportError:
             logger.warning("tensorflowjs not installed. Install with: pip install tensorflowjs")
             logger.info("Model can still be used with regular TensorFlow")
+        
+        if representative_data is not None:
+            self.export_for_tflite(os.path.join(output_dir, 'model_int8.tflite'),
+                                   representative_data=representative_data)